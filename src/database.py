@@ -29,6 +29,11 @@ class Database():
         for file in os.listdir(self.name):
             os.remove(self.name + '/' + file)
         os.rmdir(self.name)
+
+        # Forget any SELECT indexes of the removed tables
+        # (table is imported here, as only a DROP DATABASE needs it)
+        from table import drop_indexes
+        drop_indexes(self.name)
         
         print("Database " + self.name + " deleted.")
 
@@ -28,7 +28,7 @@ for additional, non-SQL interface commands like EXIT.
 import os
 import shutil
 
-from statement import StatementFactory
+from statement import make_statement
 from utils import get_input
 
 
@@ -42,14 +42,13 @@ def main(args=None):
 
         try:
             statements = get_input()
-            factory = StatementFactory()
 
             for stmt_str in statements:
                 if stmt_str == 'EXIT':
                     print('All done.')
                     quit()
 
-                stmnt = factory.make_statement(stmt_str)
+                stmnt = make_statement(stmt_str)
 
                 if stmnt.start_transaction:
                     is_transaction = True
@@ -58,9 +57,14 @@ def main(args=None):
                     # transactions work in separate "_lock.csv" version
                     # so to "commit" a transaction we actually just need
                     # to swap out <table>_lock.csv with <table>.csv
+                    # (table is imported here, as only a COMMIT needs it)
+                    from table import drop_indexes
+
                     for tbl in locked_tables:
                         os.remove(tbl)
                         os.rename(tbl + '_lock', tbl)
+                        drop_indexes(tbl)
+                        drop_indexes(tbl + '_lock')
                         stmnt.commits += 1
 
                     locked_tables = []
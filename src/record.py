@@ -6,9 +6,11 @@ Description: A class to represent a row of data in a Table. Values are
 stored as an ordered dictionary attribute called 'data' within a 
 Record. The most important method of this class is .satisfies(),
 which checks to see if the Record's data meets a given criteria, which
-must be passed to the function as a string.
+must be passed to the function as a string. compile_predicate() and
+compile_projection() do the same work on raw rows, without building a Record.
 '''
 
+import functools, operator
 from collections import OrderedDict
 
 from utils import KEYWORD_COMPARISON_OPERATORS, KEYWORD_DATA_TYPES
@@ -69,4 +71,117 @@ class Record:
                 typed_value = self.data[value]
 
             # Uses lambda function to convert operator string into actual condition
-            return KEYWORD_COMPARISON_OPERATORS[operator](target_value, typed_value)                                
+            return KEYWORD_COMPARISON_OPERATORS[operator](target_value, typed_value)
+
+    # Returns a function that checks whether a raw row (a list of str values,
+    # as read from a table file) satisfies condition, in the same way as
+    # .satisfies() would for a Record of that row. Conditions may also combine
+    # comparisons with AND / OR, like 'id > 5 AND name = x' (AND is evaluated
+    # before OR). The condition is parsed and its field indexes and types are
+    # looked up once, rather than once per row, and compiled conditions are
+    # cached for statements repeated against the same table layout
+    @staticmethod
+    def compile_predicate(fields, types, condition):
+
+        # Necessary for SQL statements that omit WHERE clause
+        if condition == None:
+            return lambda row: True
+
+        return _compile_condition(tuple(fields), tuple(types), condition)
+
+    # Returns a function that gives the list of values of a raw row for the
+    # selected fields, formatted like .get_values() would for a Record of that
+    # row. Returns all values if fields is not specified
+    @staticmethod
+    def compile_projection(fields, types, select_fields=None):
+        if select_fields == None or select_fields == ['*']:
+            indexes = range(len(fields))
+        else:
+            for field in select_fields:
+                if field not in fields:
+                    raise Exception("!Failed - " + field + " is not a valid field name")
+            indexes = [_field_index(fields, field) for field in select_fields]
+
+        if len(indexes) > 1:
+            getter = operator.itemgetter(*indexes)
+            take = lambda row: list(getter(row))
+        else:
+            take = lambda row: [row[index] for index in indexes]
+
+        # Values of types without a conversion are output as they are, so
+        # only the others need converting (which normalizes them, e.g. 03 to 3)
+        converted = [(position, index, KEYWORD_DATA_TYPES[types[index]])
+                     for position, index in enumerate(indexes)
+                     if types[index] in KEYWORD_DATA_TYPES]
+
+        if not converted:
+            return take
+
+        def get_values(row):
+            values = take(row)
+            for position, index, to_type in converted:
+                values[position] = str(to_type(row[index]))
+            return values
+
+        return get_values
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_condition(fields, types, condition):
+    or_terms = [
+        functools.reduce(_and, [_compile_comparison(fields, types, comparison)
+                                for comparison in _split_words(or_term, 'AND')])
+        for or_term in _split_words(condition.split(), 'OR')
+    ]
+    return functools.reduce(_or, or_terms)
+
+# Currently only supports comparisons in the following format:
+# <target_field> <operator> <value>, like 'id = 5'
+def _compile_comparison(fields, types, parsed):
+    if len(parsed) != 3:
+        raise Exception("Invalid condition. Please check syntax")
+
+    target_field = parsed[0]
+    operator = KEYWORD_COMPARISON_OPERATORS[parsed[1]]
+    value = parsed[2].replace("'", '')
+
+    if target_field not in fields:
+        raise Exception("!Failed - " + target_field + " is not a valid field name")
+
+    target_index = _field_index(fields, target_field)
+    target_type = _field_type(types[target_index])
+
+    # <value> can be a fixed value (converted once here) OR another <target_field>
+    if value not in fields:
+        typed_value = target_type(value)
+        return lambda row: operator(target_type(row[target_index]), typed_value)
+    else:
+        value_index = _field_index(fields, value)
+        value_type = _field_type(types[value_index])
+        return lambda row: operator(target_type(row[target_index]), value_type(row[value_index]))
+
+def _and(left, right):
+    return lambda row: left(row) and right(row)
+
+def _or(left, right):
+    return lambda row: left(row) or right(row)
+
+# Splits a list of words into the lists found between each (case-insensitive)
+# occurrence of keyword
+def _split_words(words, keyword):
+    parts = [[]]
+    for word in words:
+        if word.upper() == keyword:
+            parts.append([])
+        else:
+            parts[-1].append(word)
+    return parts
+
+# A Record keeps the last value given for a field name, so a repeated field
+# name refers to its last column
+def _field_index(fields, field):
+    return len(fields) - 1 - fields[::-1].index(field)
+
+# Values of types without a conversion are kept as str
+def _field_type(type):
+    return KEYWORD_DATA_TYPES.get(type, str)                                
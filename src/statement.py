@@ -2,9 +2,9 @@
 Name: statement.py
 Author: Michael Deckebach
 Date: 2022-10-01
-Description: Implementation of the following classes:
+Description: Implementation of the make_statement function, which creates
+the appropriate SQL statement for a command, and the following classes:
 
-    StatementFactory - Abstract class to create various SQL statements
     Statement - Interface providing the basic structure of a SQL statement
     AlterStatement - An ALTER TABLE statement
     BeginStatment - A BEGIN TRANSACTION statement
@@ -19,106 +19,97 @@ Description: Implementation of the following classes:
 
 '''
 
-import re
+import copy, functools, re, sys
 
-from database import Database
-from table import Table
 import utils
 
+# database and table are imported inside the execute() methods that use them,
+# so parsing a statement (or running BEGIN/COMMIT) does not load them
 
-# Class used to instantiate various Statement child classes, depending
-# on the type of SQL command submitted. Also checks for and throws an
-# error if unsupported SQL commands are submitted. Current support is
-# only for ALTER, CREATE, DROP, SELECT, and USE statements.
 
-class StatementFactory:
+# Precompiled patterns used by the Statement classes to parse clauses. Each is
+# anchored at the start of the statement and applied with match(), so a
+# statement that does not fit fails at the first position instead of being
+# rescanned from every offset.
+#
+# Free-text clauses are matched as a run of words (_WORDS) rather than with
+# '.*?', so a clause can never begin or end inside a stretch of whitespace.
+# That keeps matching linear on user input: there is only one way to split
+# whitespace between a clause and the keyword that follows it, so long
+# runs of spaces cannot trigger quadratic backtracking.
+_WORDS = r'\S+(?:\s+\S+)*'
 
-    def __init__(self):
-        pass
-
-    def make_statement(self, str):
-
-        if self._is_alter_statement(str):
-            return AlterStatement(str)
-
-        elif self._is_begin_statement(str):
-            return BeginStatement(str)
-        
-        elif self._is_create_statement(str):
-            return CreateStatement(str)
-
-        elif self._is_commit_statement(str):
-            return CommitStatement(str)
-
-        elif self._is_delete_statement(str):
-            return DeleteStatement(str)
-
-        elif self._is_drop_statement(str):
-            return DropStatement(str)
-
-        elif self._is_insert_statement(str):
-            return InsertStatement(str)
-
-        elif self._is_select_statement(str):
-            return SelectStatement(str)
-
-        elif self._is_update_statement(str):
-            return UpdateStatement(str)
-
-        elif self._is_use_statement(str):
-            return UseStatement(str)
-
-        else:
-            raise Exception("Command not supported: " + str)
-
-    def _is_alter_statement(self, str):
-        return bool(re.search(r'(?i)(ALTER )(.*)', str))
+_INSERT = re.compile(r'\s*INSERT\s+INTO\s+(?P<table>\S+)\s+VALUES\s*\((?P<values>.*)\)', re.I)
+_SELECT = re.compile(rf'\s*SELECT\s+(?P<select>{_WORDS}?)\s+FROM\s+(?P<from>{_WORDS}?)'
+                     rf'(?:\s+(?:ON|WHERE)\s+(?P<condition>{_WORDS}))?\s*$', re.I)
+_UPDATE = re.compile(rf'\s*UPDATE\s+(?P<table>\S+)\s+SET\s+(?P<field>[^\s=]+)\s*=\s*(?P<value>{_WORDS}?)'
+                     rf'\s+WHERE\s+(?P<condition>{_WORDS})\s*$', re.I)
 
-    def _is_begin_statement(self, str):
-        return bool(re.search(r'(?i)(BEGIN TRANSACTION)', str))
+# Words preceding JOIN in a FROM clause, mapped to the join type they select.
+# Only INNER JOIN (or a plain JOIN or ',') and LEFT [OUTER] JOIN are supported
+_JOIN_PREFIXES = {
+    ('INNER',): 'INNER',
+    ('LEFT',): 'LEFT',
+    ('LEFT', 'OUTER'): 'LEFT',
+}
 
-    def _is_create_statement(self, str):
-        return bool(re.search(r'(?i)(CREATE )(.*)', str))
+# Join keywords, which are never taken as a table alias
+_JOIN_KEYWORDS = frozenset({'CROSS', 'FULL', 'INNER', 'JOIN', 'LEFT', 'NATURAL', 'OUTER', 'RIGHT'})
 
-    def _is_commit_statement(self, str):
-        return bool(re.search(r'(?i)(COMMIT)', str))
 
-    def _is_delete_statement(self, str):
-        return bool(re.search(r'(?i)(DELETE FROM )(.*)', str))
+# Function used to instantiate various Statement child classes, depending
+# on the type of SQL command submitted. The type is decided by the first
+# one or two keywords of the command, which are looked up in STATEMENT_TYPES
+# (defined at the bottom of this module). Also checks for and throws an
+# error if unsupported SQL commands are submitted. Parsed statements are
+# cached per command string; callers get a shallow copy, since execution
+# may change the table name (transactions) or the commit count.
 
-    def _is_drop_statement(self, str):
-        return bool(re.search(r'(?i)(DROP )\w{2}', str))
+def make_statement(str):
+    return copy.copy(_parse_statement(str))
 
-    def _is_insert_statement(self, str):
-        return bool(re.search(r'(?i)(INSERT INTO )(.*)', str))
+@functools.lru_cache(maxsize=1024)
+def _parse_statement(str):
+    keywords = tuple(word.upper() for word in str.split()[:2])
 
-    def _is_select_statement(self, str):
-        return bool(re.search(r'(?i)(SELECT )(.*)', str))
+    statement_type = STATEMENT_TYPES.get(keywords[:1]) or STATEMENT_TYPES.get(keywords)
 
-    def _is_update_statement(sefl, str):
-        return bool(re.search(r'(?i)(UPDATE )(.*)( SET )(.*)', str))
+    if statement_type is None:
+        raise Exception("Command not supported: " + str)
 
-    def _is_use_statement(self, str):
-        return bool(re.search(r'(?i)(USE )\w{2}', str))
+    return statement_type(str)
 
 
 # Interface for Statement classes. Statement.str is the raw string the user
-# submitted.
+# submitted. start_transaction and end_transaction are fixed per statement
+# type, so they are class attributes overridden by BEGIN and COMMIT.
 class Statement:
 
+    __slots__ = ('str', 'parsed', 'num_words')
+
+    start_transaction = False
+    end_transaction = False
+
     def __init__(self, str):
         self.str = str
         self.parsed = str.split()
         self.num_words = len(self.parsed)
-        self.start_transaction = False
-        self.end_transaction = False
+
+    def __copy__(self):
+        # Copies slot by slot, which is several times cheaper than the generic
+        # copy.copy protocol used for objects without __copy__
+        clone = object.__new__(type(self))
+
+        for cls in type(self).__mro__[:-1]:
+            for name in cls.__slots__:
+                if hasattr(self, name):
+                    setattr(clone, name, getattr(self, name))
+
+        return clone
 
     def execute(self):
         pass
 
-    def get_locked_tables(self):
-        return self.locked_tables
-
     def get_table_name(self):
         pass
     
@@ -128,16 +119,24 @@ class Statement:
 
 class AlterStatement(Statement):
 
+    __slots__ = ('from_clause', 'new_field')
+
     def __init__(self, str):
         Statement.__init__(self, str)       
         self.parse_clauses()
 
     def execute(self):
+        from table import Table
         Table(self.from_clause).alter(self.new_field)
 
     def parse_clauses(self):
-        self.from_clause = re.search(r'(?<=ALTER TABLE\s)(.*)(?=\sADD)', self.str, re.I).group()
-        self.new_field = re.search(r'(?<=ADD\s)(.*)', self.str, re.I).group().strip()
+        # ALTER TABLE <table> ADD <field> <datatype>, read from the words
+        # already split out by Statement.__init__
+        if self.num_words < 5 or self.parsed[1].upper() != 'TABLE' or self.parsed[3].upper() != 'ADD':
+            raise Exception("Invalid ALTER command. Please check syntax")
+
+        self.from_clause = self.parsed[2]
+        self.new_field = ' '.join(self.parsed[4:])
 
     def get_table_name(self):
         return self.from_clause
@@ -148,9 +147,9 @@ class AlterStatement(Statement):
 
 class BeginStatement(Statement):
 
-    def __init__(self, str):
-        Statement.__init__(self, str)
-        self.start_transaction = True
+    __slots__ = ()
+
+    start_transaction = True
 
     def execute(self):
         print("Transaction starts.")
@@ -158,13 +157,15 @@ class BeginStatement(Statement):
 
 class CreateStatement(Statement):
 
+    __slots__ = ('type', 'object_name')
+
     def __init__(self, str):
         Statement.__init__(self, str)
 
         if not self.min_size():
             raise Exception("Invalid CREATE command. Please check syntax")
 
-        self.type = self.parsed[1].upper()
+        self.type = sys.intern(self.parsed[1].upper())
         self.object_name = self.parsed[2]
 
         if not self.correct_size():
@@ -179,7 +180,10 @@ class CreateStatement(Statement):
         elif self.type == 'TABLE':
             return self.num_words >= 3
  
-    def execute(self):        
+    def execute(self):
+        from database import Database
+        from table import Table
+
         if self.type == 'DATABASE':
             Database(self.object_name).create()
         elif self.type == 'TABLE':
@@ -194,8 +198,16 @@ class CreateStatement(Statement):
         return self.num_words >= 3
 
     def parse_fields(self, str):
-        fields = re.findall(r'(?![(].*)[^,]*(?=.*[)]$)', str)
-        return [i.strip() for i in fields if i != '']
+        # Fields are the comma-separated items inside the outermost parentheses,
+        # so the closing parenthesis of a type like varchar(20) is kept
+        start = str.find('(')
+        end = str.rfind(')')
+
+        if start == -1 or end < start:
+            return []
+
+        fields = [i.strip() for i in str[start + 1:end].split(',')]
+        return [i for i in fields if i != '']
 
     def valid_type(self):
         return self.type in utils.KEYWORDS_OBJECTS
@@ -212,9 +224,12 @@ class CreateStatement(Statement):
 
 class CommitStatement(Statement):
 
+    __slots__ = ('commits',)
+
+    end_transaction = True
+
     def __init__(self, str):
         Statement.__init__(self, str)
-        self.end_transaction = True
         self.commits = 0
 
     def execute(self):
@@ -226,17 +241,25 @@ class CommitStatement(Statement):
 
 class DeleteStatement(Statement):
 
+    __slots__ = ('table_name', 'condition')
+
     def __init__(self, str):
         Statement.__init__(self, str)
         self.parse_clauses()
 
     def execute(self):
+        from table import Table
         Table(self.table_name).delete(self.condition)
         pass
 
     def parse_clauses(self):
-        self.table_name = re.search(r'(?<=DELETE FROM\s)(\w+)', self.str, re.I).group()
-        self.condition = re.search(r'(?<=WHERE\s)(.*)', self.str, re.I).group()
+        # DELETE FROM <table> WHERE <condition>, read from the words already
+        # split out by Statement.__init__
+        if self.num_words < 5 or self.parsed[3].upper() != 'WHERE':
+            raise Exception("Invalid DELETE command. Please check syntax")
+
+        self.table_name = self.parsed[2]
+        self.condition = ' '.join(self.parsed[4:])
 
     def get_table_name(self):
         return self.table_name
@@ -247,13 +270,15 @@ class DeleteStatement(Statement):
 
 class DropStatement(Statement):
 
+    __slots__ = ('type', 'object_name')
+
     def __init__(self, str):
         Statement.__init__(self, str)
 
         if not self.correct_size():
             raise Exception("Invalid DROP command. Please check syntax")
 
-        self.type = self.parsed[1].upper()
+        self.type = sys.intern(self.parsed[1].upper())
         self.object_name = self.parsed[2]
 
         if not self.valid_type():
@@ -263,6 +288,9 @@ class DropStatement(Statement):
         return self.num_words == 3
 
     def execute(self):
+        from database import Database
+        from table import Table
+
         if self.type == 'DATABASE':
             Database(self.object_name).drop()
             pass
@@ -285,19 +313,29 @@ class DropStatement(Statement):
 
 class InsertStatement(Statement):
 
+    __slots__ = ('table_name', 'values')
+
     def __init__(self, str):
         Statement.__init__(self, str)
         self.parse_clauses()
     
     def execute(self):
+        from table import Table
         Table(self.table_name).insert(self.values)
 
     def parse_clauses(self):
         # Parses the raw string using REGEX to isolate the table_name
         # and the tuple values to be inserted for downstream use
-        self.table_name = re.search(r'(?<=INSERT INTO\s)(.*)(?=\sVALUES)', self.str, re.I).group()
+        match = _INSERT.match(self.str)
+
+        if not match:
+            raise Exception("Invalid INSERT command. Please check syntax")
+
+        self.table_name = match['table']
         
-        temp = re.search(r'(?<=\().*(?=\))', self.str).group().split(',')
+        # Whitespace is stripped before quotes are, so that padding inside a
+        # quoted value (' b ') is kept as part of the value
+        temp = match['values'].split(',')
         self.values = [i.strip().replace("'", '') for i in temp if i != '']
 
     def get_table_name(self):
@@ -309,11 +347,16 @@ class InsertStatement(Statement):
 
 class SelectStatement(Statement):
 
+    __slots__ = ('select_clause', 'from_clause', 'where_clause', 'join_type',
+                 'left_table_name', 'left_table_alias', 'right_table_name',
+                 'right_table_alias')
+
     def __init__(self, str):
         Statement.__init__(self, str)      
         self.parse_clauses()
 
     def execute(self):
+        from table import Table
         tbl = Table(self.left_table_name, alias=self.left_table_alias)
         tbl.select(self.select_clause, self.where_clause, self.join_type, self.right_table_name, self.right_table_alias)
 
@@ -321,45 +364,60 @@ class SelectStatement(Statement):
         # Parses the raw string using REGEX to isolate the contents of the 
         # SELECT clause (select_clause) and FROM clause (from_clause) for
         # downstream use
-        self.select_clause = re.search(r'(?<=SELECT\s)(.*)(?=\sFROM)', self.str, re.I).group()
-        self.select_clause = self.select_clause.split(',')
+        match = _SELECT.match(self.str)
+
+        if not match:
+            raise Exception("Invalid SELECT command. Please check syntax")
+
+        self.select_clause = match['select'].split(',')
         self.select_clause = [i.strip() for i in self.select_clause]
         
-        self.from_clause = re.search(r'(?<=FROM\s)[\w\s,]+?(?=(\s(ON|WHERE))|$)', self.str, re.I).group()
-        self.where_clause = re.search(r'(?<=WHERE|...ON)\s(.*)', self.str, re.I)
-        
-        if self.where_clause:
-            self.where_clause = self.where_clause.group()
+        self.from_clause = match['from']
+        self.where_clause = match['condition']
 
-        self.set_join_type()
         self.parse_from_clause()
 
-    def set_join_type(self):
-        # Helper function to parse join type of a SELECT clause, currently supports
-        # only INNER JOIN and LEFT OUTER JOIN syntax
-        self.join_type = None
-        if re.search(r',|INNER JOIN', self.from_clause, re.I):
-            self.join_type = 'INNER'
-        elif re.search(r'LEFT OUTER JOIN', self.from_clause, re.I):
-            self.join_type = 'LEFT'
-
     def parse_from_clause(self):
-        # Helper function to pull out table names and aliases from a FROM clause
-        # with consideration for whether it contains a JOIN
-        self.right_table = None
+        # Helper function to pull out the join type, table names and aliases from
+        # a FROM clause, split into words once. Currently supports only comma,
+        # INNER JOIN and LEFT OUTER JOIN syntax
+        self.join_type = None
         self.right_table_name = None
         self.right_table_alias = None
 
-        # Split up clause based on the JOIN keywords (or lack thereof)
-        from_split = re.split(r'(INNER JOIN|LEFT OUTER JOIN|,)', self.from_clause, maxsplit=3, flags=re.I)
+        words = self.from_clause.replace(',', ' , ').split()
 
-        # This is the entire string up to any JOIN keyword, split into a list
-        left_table = from_split[0].strip().split()
+        # The left table ends at the first ',' or JOIN
+        separator = next((i for i, word in enumerate(words) if word == ',' or word.upper() == 'JOIN'), None)
 
-        if len(from_split) == 1:
-            right_table = None
+        if separator is None:
+            left_table = words
+            right_table = []
         else:
-            right_table = from_split[2].strip().split()
+            left_table = words[:separator]
+            right_table = words[separator + 1:]
+            self.join_type = 'INNER'
+
+            # Any words between the left table's name and JOIN pick the join type
+            if words[separator] != ',':
+                for prefix, join_type in _JOIN_PREFIXES.items():
+                    if (len(left_table) > len(prefix)
+                            and tuple(word.upper() for word in left_table[-len(prefix):]) == prefix):
+                        self.join_type = join_type
+                        del left_table[-len(prefix):]
+                        break
+
+        # Which leaves each table as a name and an optional alias, where any
+        # other (join) word, or a third table, is unsupported syntax
+        for table in (left_table, right_table):
+            if (len(table) > 2
+                    or any(word == ',' or word.upper() in _JOIN_KEYWORDS for word in table)):
+                raise Exception("Invalid SELECT command. Please check syntax")
+
+        if not left_table or (self.join_type and not right_table):
+            raise Exception("Invalid SELECT command. Please check syntax")
+
+        if right_table:
             self.right_table_name = right_table[0]
 
             # If len == 2, then that means the user entered an alias
@@ -387,18 +445,26 @@ class SelectStatement(Statement):
 
 class UpdateStatement(Statement):
 
+    __slots__ = ('table_name', 'target_field', 'target_value', 'condition')
+
     def __init__(self, str):
         Statement.__init__(self, str)
         self.parse_clauses()
 
     def execute(self):
+        from table import Table
         Table(self.table_name).update(self.target_field, self.target_value, self.condition)
 
     def parse_clauses(self):
-        self.table_name = re.search(r'(?<=UPDATE\s)(.*)(?=\sSET)', self.str, re.I).group()
-        self.target_field = re.search(r'(?<=SET\s)(.*?)(?=\s=)', self.str, re.I).group().replace("'", '')
-        self.target_value = re.search(r'(?<==\s)(.*)(?=\sWHERE)', self.str, re.I).group().replace("'", '')
-        self.condition = re.search(r'(?<=WHERE\s)(.*)', self.str, re.I).group()
+        match = _UPDATE.match(self.str)
+
+        if not match:
+            raise Exception("Invalid UPDATE command. Please check syntax")
+
+        self.table_name = match['table']
+        self.target_field = match['field'].replace("'", '')
+        self.target_value = match['value'].replace("'", '')
+        self.condition = match['condition']
 
     def get_table_name(self):
         return self.table_name
@@ -408,6 +474,8 @@ class UpdateStatement(Statement):
 
 class UseStatement(Statement):
 
+    __slots__ = ('object_name',)
+
     def __init__(self, str):
         Statement.__init__(self, str)
 
@@ -420,5 +488,22 @@ class UseStatement(Statement):
         return self.num_words == 2
 
     def execute(self):
+        from database import Database
         Database(self.object_name).use()
-        pass
\ No newline at end of file
+        pass
+
+
+# Maps the leading keyword(s) of a SQL command to the Statement class that
+# implements it. Used by make_statement.
+STATEMENT_TYPES = {
+    ('ALTER',): AlterStatement,
+    ('BEGIN', 'TRANSACTION'): BeginStatement,
+    ('CREATE',): CreateStatement,
+    ('COMMIT',): CommitStatement,
+    ('DELETE', 'FROM'): DeleteStatement,
+    ('DROP',): DropStatement,
+    ('INSERT', 'INTO'): InsertStatement,
+    ('SELECT',): SelectStatement,
+    ('UPDATE',): UpdateStatement,
+    ('USE',): UseStatement,
+}
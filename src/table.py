@@ -9,36 +9,80 @@ a single table. Field names and types are stored in the first row of the file.
 Currently supports ALTER, CREATE, DELETE, DROP, SELECT, and UPDATE commands.
 '''
 
-import csv, os, re
+import contextlib, csv, gc, os, re, sys
+from collections import OrderedDict, defaultdict
 
 from record import Record
+from utils import KEYWORD_DATA_TYPES
+
+# Aggregation in a SELECT clause, like 'COUNT(*)', giving the aggregation
+# keyword and the field it operates on
+_AGG_RE = re.compile(r'(COUNT|AVG|MAX)\((.*)\)', re.I)
+
+# Buffer size for the temporary files that ALTER, DELETE and UPDATE stream
+# their rewritten tables into
+WRITE_BUFFER_SIZE = 1 << 20
+
+# Equality indexes built by SELECT, kept in memory for the rest of the session.
+# Keyed by (table file path, field name), each maps a field's (typed) values
+# to the byte offsets of the rows holding them (or is None if the field could
+# not be indexed), along with the stat of the file it was built from so that
+# any change to the table invalidates it. The cache is kept in least recently
+# used order and holds at most INDEX_CACHE_ROWS row offsets across all of its
+# indexes: older indexes are evicted to make room, and a field of a table with
+# more rows than that is not indexed at all
+INDEX_CACHE_ROWS = 1 << 20
+_INDEXES = OrderedDict()
+
+# Size of the blocks read when counting the lines of a table file
+READ_CHUNK_SIZE = 1 << 20
+
+# Unquoted tables of at least this size have MAX and AVG computed by several
+# processes, each aggregating a PARALLEL_CHUNK_SIZE slice of the file
+PARALLEL_MIN_SIZE = 64 << 20
+PARALLEL_CHUNK_SIZE = 16 << 20
+
+# Number of result rows SELECT collects before writing them out in one go
+OUTPUT_BATCH_ROWS = 8192
 
 class Table():
     def __init__(self, name, alias=None):
         self.name = name
         self.alias = alias
+        self._stat = None
 
     def alter(self, new_field):
-        self._check_table_exists("alter")
+        self._begin_op("alter")
     
-        altered = []
-        with open(self.name) as csvfile:
-            reader = csv.reader(csvfile)
-
-            # Alter the first row (headers)
-            headers = next(reader)
-            headers.append(new_field)
-            altered.append(headers)
-
-            # Default value of None for existing records for the new field
-            for row in reader:
-                row.append(None)
-                altered.append(row)
-        
-        with open(self.name, 'w') as csvfile:
-            writer = csv.writer(csvfile, lineterminator='\n')
-            writer.writerows(altered)
-            print("Table " + self.name + " modified.")
+        # Rows are streamed into a temporary file, which then replaces the table
+        temp_name = self.name + '.tmp'
+
+        try:
+            with (_no_gc(),
+                  _open_sequential(self.name) as csvfile,
+                  open(temp_name, 'w', buffering=WRITE_BUFFER_SIZE) as temp_csvfile
+            ):
+                reader = csv.reader(csvfile)
+                writerow = _row_writer(temp_csvfile)
+
+                # Alter the first row (headers)
+                headers = next(reader)
+                headers.append(new_field)
+                writerow(headers)
+
+                # Default value of None (an empty value) for existing records for
+                # the new field
+                for row in reader:
+                    row.append('')
+                    writerow(row)
+        except Exception:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temp_name)
+            raise
+
+        os.replace(temp_name, self.name)
+        drop_indexes(self.name)
+        print("Table " + self.name + " modified.")
 
     def create(self, fields):
         if os.path.exists(self.name):
@@ -50,30 +94,43 @@ class Table():
             print("Table " + self.name + " created.")   
 
     def delete(self, condition):
-        
-        field_names = self._get_field_names()
-        field_types = self._get_field_types()
-        count_deleted = 0
-        updated = []
-
-        self._check_table_exists("delete records from table")
-
-        with open(self.name) as csvfile:
-            reader = csv.reader(csvfile)
-            updated.append(next(reader))
-
-            for row in reader:
+        self._begin_op("delete records from table")
 
-                record = Record(field_names, field_types, row)
-
-                if record.satisfies(condition):
-                    count_deleted += 1
-                else:
-                    updated.append(record.get_values())
+        field_names, field_types = self._header()
+        count_deleted = 0
 
-        with open(self.name, 'w') as csvfile:
-            writer = csv.writer(csvfile, lineterminator='\n')
-            writer.writerows(updated)
+        satisfies = Record.compile_predicate(field_names, field_types, condition)
+        get_values = Record.compile_projection(field_names, field_types)
+
+        # Retained rows are streamed into a temporary file, which then replaces
+        # the table
+        temp_name = self.name + '.tmp'
+
+        try:
+            with (_no_gc(),
+                  _open_sequential(self.name) as csvfile,
+                  open(temp_name, 'w', buffering=WRITE_BUFFER_SIZE) as temp_csvfile
+            ):
+                reader = csv.reader(csvfile)
+                writerow = _row_writer(temp_csvfile)
+                writerow(next(reader))
+
+                for row in reader:
+                    if satisfies(row):
+                        count_deleted += 1
+                    else:
+                        writerow(get_values(row))
+        except Exception:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temp_name)
+            raise
+
+        # The table is only replaced if at least one record was removed
+        if count_deleted > 0:
+            os.replace(temp_name, self.name)
+            drop_indexes(self.name)
+        else:
+            os.remove(temp_name)
         
         if count_deleted == 1:
             print(str(count_deleted) + " record deleted.")
@@ -81,8 +138,9 @@ class Table():
             print(str(count_deleted) + " records deleted.")
 
     def drop(self):
-        self._check_table_exists("delete")        
+        self._begin_op("delete")
         os.remove(self.name)
+        drop_indexes(self.name)
         print("Table " + self.name + " deleted.")
 
     def select(self, select_clause, where_clause=None, join_type=None, right_table=None, right_table_alias=None):
@@ -91,32 +149,73 @@ class Table():
 
         if join_type:
             self.join_select(select_clause, where_clause, join_type, right_table, right_table_alias)
-        elif len(select_clause) == 1 and re.search(r'(COUNT|AVG|MAX)\(.*?\)', select_clause[0], re.I):
+        elif len(select_clause) == 1 and _AGG_RE.match(select_clause[0]):
             self.agg_select(select_clause)
         else:
             self.single_select(select_clause, where_clause)
 
     def agg_select(self, select_clause):
-        self._check_table_exists("query")
+        self._begin_op("query")
 
         # pull out the aggregation keyword and field to be operated on
-        agg_type = re.search(r'.*(?=\()', select_clause[0], re.I).group()
-        field_name = re.search(r'(?<=\().*(?=\))', select_clause[0], re.I).group()
+        match = _AGG_RE.match(select_clause[0])
+        agg_type = match[1].upper()
+        field_name = match[2]
         
-        # loop through the table and add all values to a list for aggregation
-        values = []
-        with open(self.name, newline='\n') as csvfile:
-            reader = csv.reader(csvfile)
-            header = next(reader)
-            for row in reader:
-                record = Record(self._get_field_names(), self._get_field_types(), row)
-                values.append(int(record.get_values([field_name])[0]))
+        field_names, field_types = self._header()
+
+        # MAX and AVG operate on a single column, converted by its type
+        # (as an int for non-numeric types)
+        if agg_type in ('MAX', 'AVG'):
+            if field_name not in field_names:
+                raise Exception("!Failed - " + field_name + " is not a valid field name")
+
+            index = field_names.index(field_name)
+            to_number = KEYWORD_DATA_TYPES.get(field_types[index], int)
+
+        # A table without quote characters holds exactly one row per line, so
+        # COUNT only needs its number of lines, and MAX and AVG can split each
+        # line as bytes, which is far cheaper than csv.reader (the column
+        # readers raise a ValueError on quotes, to fall back to it)
+        count = values = summary = None
+
+        if agg_type == 'COUNT':
+            line_count, quoted = self._count_lines()
+            if not quoted:
+                count = line_count - 1
+        elif agg_type in ('MAX', 'AVG'):
+            try:
+                # Large tables are split among processes, except for the
+                # AVG of floats, whose sum depends on the order of addition
+                if (self._stat.st_size >= PARALLEL_MIN_SIZE and (os.cpu_count() or 1) > 1
+                        and (agg_type == 'MAX' or field_types[index] != 'float')):
+                    summary = self._parallel_aggregate(index, field_types[index])
+                else:
+                    values = self._read_column(index, to_number)
+            except (ValueError, IndexError):
+                # Leave any error to be raised by the csv.reader path below
+                pass
+
+        # Otherwise, loop through the table as plain rows (no Record per row),
+        # counting them or adding the aggregated column's values to a list
+        if count is None and values is None and summary is None:
+            with _no_gc(), _open_sequential(self.name, newline='\n') as csvfile:
+                reader = csv.reader(csvfile)
+                header = next(reader)
+
+                if agg_type == 'COUNT':
+                    count = sum(1 for row in reader)
+                elif agg_type in ('MAX', 'AVG'):
+                    values = [to_number(row[index]) for row in reader]
 
         print(select_clause[0])
 
         # print out the aggregation based on the keyword used
         if agg_type == 'COUNT':
-            print(len(values))
+            print(count)
+        elif summary is not None:
+            count, total, maximum = summary
+            print(maximum if agg_type == 'MAX' else (total * 1.0 ) / count)
         elif agg_type == 'MAX':
             print(max(values))
         elif agg_type == 'AVG':
@@ -125,23 +224,27 @@ class Table():
     def join_select(self, select_clause, where_clause, join_type, right_table, right_table_alias):
         right = Table(right_table, right_table_alias)
 
-        self._check_table_exists("query")
-        right._check_table_exists("query")
+        self._begin_op("query")
+        right._begin_op("query")
 
-        field_names = self._get_field_names() + right._get_field_names()
-        field_types = self._get_field_types() + right._get_field_types()
+        left_field_names, left_field_types = self._header()
+        right_field_names, right_field_types = right._header()
+        field_names = left_field_names + right_field_names
+        field_types = left_field_types + right_field_types
 
         # Current functionality only supports unique field names across tables,
         # so parsing WHERE clause to substitute any alias references for just
         # the field name
-        if self.alias:
-            where_clause = where_clause.replace(self.alias + '.', '')
-        if right.alias:
-            where_clause = where_clause.replace(right_table_alias + '.', '')
-
-        # JOIN is performed by nested looping of both table files
-        with (open(self.name, newline='\n') as l_csvfile,
-              open(right.name, newline='\n') as r_csvfile
+        aliases = [re.escape(alias) for alias in (self.alias, right.alias) if alias]
+        if aliases and where_clause:
+            alias_prefix = re.compile(r'(?<![\w.])(?:' + '|'.join(aliases) + r')\.')
+            where_clause = alias_prefix.sub('', where_clause)
+
+        equi_join = self._parse_equi_join(where_clause, left_field_names, right_field_names)
+
+        with (_no_gc(),
+              _open_sequential(self.name, newline='\n') as l_csvfile,
+              _open_sequential(right.name, newline='\n') as r_csvfile
         ):
             l_reader = csv.reader(l_csvfile)
             r_reader = csv.reader(r_csvfile)
@@ -149,40 +252,65 @@ class Table():
             header = next(l_reader) + next(r_reader)
             print('|'.join(header))
 
-            for l_row in l_reader:
-                # Boolean value used to trigger extra record in LEFT OUTER JOIN
-                # if no matches are found
-                is_printed = False
+            get_values = Record.compile_projection(field_names, field_types, select_clause)
+
+            if equi_join:
+                # An equality between a left and a right field is performed as
+                # a hash join: the right table is read once into a dict keyed on
+                # its (typed) join field, and each left row looks up its matches
+                l_index, r_index = equi_join
+                l_type = KEYWORD_DATA_TYPES.get(field_types[l_index], str)
+                r_type = KEYWORD_DATA_TYPES.get(field_types[len(left_field_names) + r_index], str)
 
+                r_rows = defaultdict(list)
                 for r_row in r_reader:
-                    
-                    combined_row = l_row + r_row
-                    record = Record(field_names, field_types, combined_row)
+                    r_rows[r_type(r_row[r_index])].append(r_row)
 
-                    if record.satisfies(where_clause):
-                        results = record.get_values(select_clause)
-                        print('|'.join(results))
+                def matching_rows(l_row):
+                    for r_row in r_rows.get(l_type(l_row[l_index]), ()):
+                        yield l_row + r_row
+
+            else:
+                # Any other condition is performed by nested looping of both
+                # table files
+                satisfies = Record.compile_predicate(field_names, field_types, where_clause)
+
+                def matching_rows(l_row):
+                    for r_row in r_reader:
+                        row = l_row + r_row
+
+                        if satisfies(row):
+                            yield row
+
+                    # Move the right file reader back to the first data row
+                    r_csvfile.seek(0)
+                    next(r_reader)
+
+            def result_rows():
+                for l_row in l_reader:
+                    # Boolean value used to trigger extra record in LEFT OUTER JOIN
+                    # if no matches are found
+                    is_printed = False
+
+                    for row in matching_rows(l_row):
+                        yield get_values(row)
                         is_printed = True
-   
-                # Extra steps to output extra record in LEFT OUTER JOIN if
-                # no matches with the right table were found
-                if join_type == 'LEFT' and is_printed == False:
-                    null_values = len(header) - len(l_row)                    
-                    left_join_row = l_row + ['' for i in range(null_values)]
-                    print(('|').join(left_join_row))
 
-                # Move the right file reader back to the first data row
-                r_csvfile.seek(0)
-                next(r_reader)
+                    # Extra steps to output extra record in LEFT OUTER JOIN if
+                    # no matches with the right table were found
+                    if join_type == 'LEFT' and is_printed == False:
+                        null_values = len(header) - len(l_row)
+                        yield l_row + ['' for i in range(null_values)]
 
+            # Result rows are written out in batches rather than printed one by one
+            _write_rows(result_rows())
 
     def single_select(self, select_clause, where_clause=None):
-        self._check_table_exists("query")
+        self._begin_op("query")
 
-        field_names = self._get_field_names()
-        field_types = self._get_field_types()
+        field_names, field_types = self._header()
 
-        with open(self.name, newline='\n') as csvfile:
+        with _no_gc(), _open_sequential(self.name, newline='\n') as csvfile:
             reader = csv.reader(csvfile)
 
             # Special code to handle headers separately, because they do not adhere
@@ -195,89 +323,404 @@ class Table():
             else:
                 print('|'.join(results))
 
+            # The WHERE and SELECT clauses are compiled once into functions of a
+            # raw row, rather than building a Record for every row
+            satisfies = Record.compile_predicate(field_names, field_types, where_clause)
+            get_values = Record.compile_projection(field_names, field_types, select_clause)
 
-            for row in reader:
-                record = Record(field_names, field_types, row)
-
-                if not record.satisfies(where_clause):
-                    continue
-                else:
-                    results = record.get_values(select_clause)
-                    print('|'.join(results))
+            # A '<field> = <value>' condition only reads the matching rows if
+            # the field can be indexed, instead of scanning the whole table
+            rows = self._indexed_rows(where_clause, field_names, field_types, csvfile.encoding)
+            if rows is None:
+                _write_rows(get_values(row) for row in reader if satisfies(row))
+            else:
+                # Rows fetched by the index are still checked against the
+                # condition, in case the index is out of date
+                _write_rows(get_values(row) for row in rows if satisfies(row))
 
     def insert(self, values):
-        self._check_table_exists("insert into")
+        self._begin_op("insert into")
         
-        fields = self._get_field_names()
+        fields = self._header()[0]
         if len(fields) != len(values):
             raise Exception("!Failed to insert into " + self.name + " because field counts do not match.")
 
         with open(self.name, 'a') as csvfile:
             writer = csv.writer(csvfile)
             writer.writerow(values)
-            print("1 new record inserted.")   
+
+        drop_indexes(self.name)
+        print("1 new record inserted.")   
 
     def update(self, target_field, new_value, condition):
-        self._check_table_exists("update")
+        self._begin_op("update")
 
-        field_names = self._get_field_names()
-        field_types = self._get_field_types()
+        field_names, field_types = self._header()
         count_modified = 0
-        updated = []
         
         if target_field not in field_names:
             raise Exception("!Failed to update " + self.name + " because " + target_field + " not in table.")
 
-        with open(self.name) as csvfile:
-            reader = csv.reader(csvfile)
-            updated.append(next(reader))
-
-            for row in reader:
-
-                record = Record(field_names, field_types, row)
-
-                if record.satisfies(condition):
-                    record.set_value(target_field, new_value)
-                    updated.append(record.get_values())
-                    count_modified += 1
-                else:
-                    updated.append(record.get_values())
-
-        with open(self.name, 'w') as csvfile:
-            writer = csv.writer(csvfile, lineterminator='\n')
-            writer.writerows(updated)
+        satisfies = Record.compile_predicate(field_names, field_types, condition)
+        get_values = Record.compile_projection(field_names, field_types)
+        target_index = field_names.index(target_field)
+
+        # Rows are streamed into a temporary file, which then replaces the table
+        temp_name = self.name + '.tmp'
+
+        try:
+            with (_no_gc(),
+                  _open_sequential(self.name) as csvfile,
+                  open(temp_name, 'w', buffering=WRITE_BUFFER_SIZE) as temp_csvfile
+            ):
+                reader = csv.reader(csvfile)
+                writerow = _row_writer(temp_csvfile)
+                writerow(next(reader))
+
+                for row in reader:
+                    values = get_values(row)
+
+                    if satisfies(row):
+                        values[target_index] = new_value
+                        count_modified += 1
+
+                    writerow(values)
+        except Exception:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temp_name)
+            raise
+
+        # The table is only replaced if at least one record was modified
+        if count_modified > 0:
+            os.replace(temp_name, self.name)
+            drop_indexes(self.name)
+        else:
+            os.remove(temp_name)
         
         if count_modified == 1:
             print(str(count_modified) + " record modified.")
         else:
             print(str(count_modified) + " records modified.")
 
-    def _check_table_exists(self, action):
-       if not os.path.exists(self.name):
+    def _begin_op(self, action):
+        # Checks that the table exists at the start of an operation, with a
+        # single stat of its file. The stat is kept for the rest of the
+        # operation (e.g. to stamp an index or size up the file) instead of
+        # statting the file again at each step
+        try:
+            self._stat = os.stat(self.name)
+        except FileNotFoundError:
             raise Exception("!Failed to " + action + " " + self.name + " because it does not exist.")
   
-    def _get_field_names(self):
-        self._check_table_exists("retrieve field names for table")
-        
-        field_names = []
-        with open(self.name) as csvfile:
-            reader = csv.reader(csvfile)
-            field_names = next(reader)
+    def _parse_equi_join(self, condition, left_field_names, right_field_names):
+        # Returns the indexes of the (left, right) fields compared by condition
+        # if it is an equality between a field of each table, like
+        # 'id = employeeID', otherwise None. Reads the condition the same way
+        # Record.satisfies does
+        if condition == None:
+            return None
+
+        parsed = condition.split()
+
+        if len(parsed) != 3 or parsed[1] != '=':
+            return None
+
+        target_field = parsed[0]
+        value = parsed[2].replace("'", '')
+
+        # A field name present in both tables resolves to the right table's
+        # field inside a Record, so leave those conditions to the nested loop
+        field_names = left_field_names + right_field_names
+        if field_names.count(target_field) != 1 or field_names.count(value) != 1:
+            return None
+
+        if target_field in left_field_names and value in right_field_names:
+            return left_field_names.index(target_field), right_field_names.index(value)
+        elif value in left_field_names and target_field in right_field_names:
+            return left_field_names.index(value), right_field_names.index(target_field)
+        else:
+            return None
+
+    def _indexed_rows(self, condition, field_names, field_types, encoding):
+        # Returns the rows matching condition, in table order, using an index
+        # on its field if condition is an equality between a field and a fixed
+        # value (like 'id = 5'). Returns None if the table must be scanned
+        if condition == None:
+            return None
+
+        parsed = condition.split()
+
+        if len(parsed) != 3 or parsed[1] != '=':
+            return None
+
+        target_field = parsed[0]
+        value = parsed[2].replace("'", '')
+
+        if field_names.count(target_field) != 1 or value in field_names:
+            return None
+
+        to_type = KEYWORD_DATA_TYPES.get(field_types[field_names.index(target_field)], str)
+        index = self._load_index(target_field, field_names, to_type, encoding)
+        if index is None:
+            return None
+
+        offsets = index.get(to_type(value), ())
+        return csv.reader(self._read_lines(offsets, encoding))
+
+    def _read_lines(self, offsets, encoding):
+        with open(self.name, 'rb') as csvfile:
+            for offset in offsets:
+                csvfile.seek(offset)
+                yield csvfile.readline().decode(encoding)
+
+    def _load_index(self, field, field_names, to_type, encoding):
+        # Returns the index of field's values, building it with one pass over
+        # the table file if there is none or the file changed since it was.
+        # Rows are found by their line offsets, so tables with quoted values
+        # (which may span lines), with values that fail to convert, or with more
+        # rows than INDEX_CACHE_ROWS, are not indexed and return None. That outcome is kept as well, so such tables
+        # are not scanned again for an index until they change
+        path = os.path.abspath(self.name)
+        stat = self._stat
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        key = (path, field)
+        cached = _INDEXES.get(key)
+        if cached is not None and cached[0] == stamp:
+            _INDEXES.move_to_end(key)
+            return cached[1]
+
+        field_index = field_names.index(field)
+        index = defaultdict(list)
+        rows = 0
+
+        with _no_gc(), _open_sequential(path, 'rb') as csvfile:
+            offset = len(csvfile.readline())
+
+            for line in csvfile:
+                rows += 1
+                if b'"' in line or rows > INDEX_CACHE_ROWS:
+                    index = None
+                    break
+
+                row = line.decode(encoding).rstrip('\r\n').split(',')
+
+                try:
+                    index[to_type(row[field_index])].append(offset)
+                except (ValueError, IndexError):
+                    index = None
+                    break
+
+                offset += len(line)
+
+        if index is None:
+            rows = 0
+        else:
+            index = dict(index)
 
-        field_names = [field.split()[0] for field in field_names]
-        
-        return field_names
+        _INDEXES[key] = (stamp, index, rows)
+        _INDEXES.move_to_end(key)
+
+        cached_rows = sum(entry[2] for entry in _INDEXES.values())
+        while cached_rows > INDEX_CACHE_ROWS:
+            cached_rows -= _INDEXES.popitem(last=False)[1][2]
+
+        return index
+
+    def _count_lines(self):
+        # Returns the number of lines in the table file (including the header)
+        # and whether any quote character appears in it. Counting stops at the
+        # first quote, as quoted values may span lines, so the count is only
+        # complete for unquoted files
+        line_count = 0
+        last_block = b''
+
+        with _open_sequential(self.name, 'rb') as csvfile:
+            while block := csvfile.read(READ_CHUNK_SIZE):
+                if b'"' in block:
+                    return line_count, True
+
+                line_count += block.count(b'\n')
+                last_block = block
+
+        # The last line may not end with a line terminator
+        if last_block and not last_block.endswith(b'\n'):
+            line_count += 1
+
+        return line_count, False
+
+    def _read_column(self, index, to_type):
+        # Returns the converted values of a column for every row, reading the
+        # table file in blocks of whole lines (see _column_values)
+        values = []
+
+        with _no_gc(), _open_sequential(self.name, 'rb') as csvfile:
+            next(csvfile)
+
+            while block := csvfile.read(READ_CHUNK_SIZE):
+                if not block.endswith(b'\n'):
+                    block += csvfile.readline()
+                values += _column_values(block, index, to_type)
+
+        return values
+
+    def _parallel_aggregate(self, index, type):
+        # Returns the (count, sum, max) of a column's values, aggregating slices
+        # of the file in a pool of processes. Imported here, as only large
+        # tables need it
+        from concurrent.futures import ProcessPoolExecutor
+
+        with open(self.name, 'rb') as csvfile:
+            start = len(csvfile.readline())
+
+        size = self._stat.st_size
+        bounds = list(range(start, size, PARALLEL_CHUNK_SIZE)) + [size]
+        path = os.path.abspath(self.name)
+
+        with ProcessPoolExecutor() as executor:
+            parts = list(executor.map(_aggregate_lines, [path] * (len(bounds) - 1),
+                                      bounds[:-1], bounds[1:], [index] * (len(bounds) - 1),
+                                      [type] * (len(bounds) - 1)))
+
+        count = sum(part[0] for part in parts)
+        total = sum(part[1] for part in parts)
+        maximum = max(part[2] for part in parts if part[0])
+        return count, total, maximum
+
+    def _header(self):
+        # Returns the tuples of field names and types from the header row, both
+        # read in a single open and a single split of each header field. Each
+        # operation reads the header once, as a new Table is made per statement
+        if self._stat is None:
+            self._begin_op("retrieve field names for table")
 
-    def _get_field_types(self):
-        self._check_table_exists("retrieve field types for table")
-        
-        header = []
         with open(self.name) as csvfile:
             reader = csv.reader(csvfile)
             header = next(reader)
 
-        field_types = [field.split()[1] for field in header]
-        
-        return field_types
-
-
+        splits = [field.split() for field in header]
+        field_names = tuple(split[0] for split in splits)
+        field_types = tuple(split[1] for split in splits)
+        return field_names, field_types
+
+
+def drop_indexes(name):
+    # Discards the SELECT indexes of a table file, or of every table under a
+    # database directory. Called whenever a table file is written, replaced or
+    # removed (including by COMMIT, which swaps in the "_lock" version of a
+    # table, and by DROP DATABASE), rather than relying only on the stat stamp
+    path = os.path.abspath(name)
+    prefix = os.path.join(path, '')
+    for key in [key for key in _INDEXES
+                if key[0] == path or key[0].startswith(prefix)]:
+        del _INDEXES[key]
+
+
+def _aggregate_lines(path, start, end, index, type):
+    # Returns the (count, sum, max) of the index-th values of the lines of a
+    # table file that begin within the byte range [start, end). A line that
+    # starts before start belongs to the previous range, and the line which
+    # is still going on at end is completed. Values are converted by their
+    # type (as an int for non-numeric types)
+    to_number = KEYWORD_DATA_TYPES.get(type, int)
+
+    with open(path, 'rb') as csvfile:
+        if start > 0:
+            csvfile.seek(start - 1)
+            if csvfile.read(1) != b'\n':
+                csvfile.readline()
+
+        position = csvfile.tell()
+        data = csvfile.read(max(end - position, 0))
+        if data and not data.endswith(b'\n'):
+            data += csvfile.readline()
+
+    values = _column_values(data, index, to_number)
+    return len(values), sum(values), max(values, default=None)
+
+
+def _column_values(data, index, to_type):
+    # Returns the converted index-th values of the lines in data, a block of
+    # whole lines read from a table file. Raises a ValueError if the block
+    # contains a quote character, as quoted values (which may hold commas or
+    # span lines) need csv.reader
+    if b'"' in data:
+        raise ValueError("quoted values in table file")
+
+    lines = data.split(b'\n')
+    if lines[-1] == b'':
+        lines.pop()
+
+    return [to_type(line.split(b',')[index]) for line in lines]
+
+
+def _open_sequential(path, *args, **kwargs):
+    # Opens a table file that is about to be read from start to end, hinting
+    # the kernel (where supported) to read ahead more aggressively
+    csvfile = open(path, *args, **kwargs)
+
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(csvfile.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+
+    return csvfile
+
+def _row_writer(csvfile):
+    # Returns a function that writes a row (a list of str values) to csvfile
+    # exactly as csv.writer(csvfile, lineterminator='\n').writerow would. Rows
+    # are joined directly, and only those with a value that needs quoting (or
+    # a single empty value) are left to the csv module
+    write = csvfile.write
+    csv_writerow = csv.writer(csvfile, lineterminator='\n').writerow
+
+    def writerow(row):
+        line = ','.join(row)
+
+        if (line.count(',') != len(row) - 1 or '"' in line or '\n' in line
+                or '\r' in line or line == ''):
+            csv_writerow(row)
+        else:
+            write(line + '\n')
+
+    return writerow
+
+
+@contextlib.contextmanager
+def _no_gc():
+    # Turns off the cyclic garbage collector while a table is scanned or
+    # rewritten. Those loops create a lot of short-lived lists (one or more
+    # per row) but no reference cycles, so the collector's frequent passes
+    # over them find nothing to free. No collection is forced afterwards,
+    # since it would walk every live object (e.g. the SELECT indexes) for
+    # the same result
+    enabled = gc.isenabled()
+    gc.disable()
+
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _write_rows(rows):
+    # Writes rows (lists of values) to stdout using a | separator, one line per
+    # row. Lines are joined and written in batches of OUTPUT_BATCH_ROWS rather
+    # than printed one at a time; rows already produced are still written out
+    # if producing the next one fails
+    write = sys.stdout.write
+    join = '|'.join
+    batch = []
+
+    try:
+        for row in rows:
+            batch.append(join(row))
+
+            if len(batch) == OUTPUT_BATCH_ROWS:
+                write('\n'.join(batch) + '\n')
+                batch.clear()
+    finally:
+        if batch:
+            write('\n'.join(batch) + '\n')
@@ -20,10 +20,10 @@ KEYWORDS_COMMANDS = {
     'USE',
 }
 
-KEYWORDS_OBJECTS = {
+KEYWORDS_OBJECTS = frozenset({
     'DATABASE',
     'TABLE'
-}
+})
 
 KEYWORD_COMPARISON_OPERATORS = {
     '=' : lambda l, r: l == r,
@@ -34,9 +34,11 @@ KEYWORD_COMPARISON_OPERATORS = {
     '!=': lambda l, r: l != r
 }
 
+# Conversions are the built-in types themselves (rather than lambdas calling
+# them), as they are applied to every value read from a table
 KEYWORD_DATA_TYPES = {
-    'int'   : lambda s: int(s),
-    'float' : lambda s: float(s)
+    'int'   : int,
+    'float' : float
 }
 
 ###############################################################################